@@ -22,41 +22,42 @@ def set_constants(adapter_name):
         'supported_systems': ['darwin', 'linux']
     }
 
-    # TESTS are constants used by execute_test() function
+    # TESTS are constants used by execute_task() function, one call per task of each test
     # Available 'tasks': 'ping ping6 traceroute traceroute6 curl curl6 route route6'
+    # List them as a tuple, e.g. ('ping', 'curl')
     # '6' stands for IPv6-variant of the task
     # You may add or modify tests according to your needs
 
     tests['universal'] = {
         'google_dns': {
             'target': '8.8.8.8',
-            'tasks': 'ping route',
+            'tasks': ('ping', 'route'),
             'filename': '8888'
         },
         'google_com': {
             'target': 'google.com',
-            'tasks': 'ping ping6 curl curl6',
+            'tasks': ('ping', 'ping6', 'curl', 'curl6'),
             'filename': 'googlecom'
         },
         'facebook': {
             'target': 'facebook.com',
-            'tasks': 'ping ping6 curl curl6',
+            'tasks': ('ping', 'ping6', 'curl', 'curl6'),
             'filename': 'facebook'
         },
         'youtube': {
             'target': 'youtube.com',
-            'tasks': 'ping ping6 curl curl6',
+            'tasks': ('ping', 'ping6', 'curl', 'curl6'),
             'filename': 'youtube'
         },
         'the_wlpc': {
             'target': 'thewlpc.com',
-            'tasks': 'ping curl traceroute',
+            'tasks': ('ping', 'curl', 'traceroute'),
             'filename': 'wlpc'
         },
         # 'gateway' is treated in a special way, check test_ping()
         'gateway': {
             'target': 'gw_placeholder', # don't change 'gw_placeholder'
-            'tasks': 'ping ping6',
+            'tasks': ('ping', 'ping6'),
             'filename': 'gateway'
         },
     }
@@ -73,7 +74,7 @@ def set_constants(adapter_name):
         'get_gateway_ipv4_command': 'netstat -rn',
         'get_gateway_ipv6_command': 'netstat -rn',
 
-        'gateway_ipv4_regex': rf'default +(\d+.\d+.\d+.\d+) +\S+ +{adapter_name}',
+        'gateway_ipv4_regex': rf'default +(\d+\.\d+\.\d+\.\d+) +\S+ +{adapter_name}',
         'gateway_ipv6_regex': rf'default +(\S+:\S+) + +\S+ +{adapter_name}',
 
         'tcpdump_command': f'tcpdump -i {adapter_name} -W 1 -G 90 -w',
@@ -107,9 +108,15 @@ def set_constants(adapter_name):
     }
 
     # DIAGNOSTICS are constants used by get_diagnostics() function
+    # 'expressions': None puts the whole output to the summary, [] puts nothing
+    # 'command' is split once when the config is read, or use 'argv': ('ifconfig', adapter_name)
     diagnostics['darwin'] = {
         'log_show': {
-            'command': 'log show --info --debug --last 5m',
+            # Only Wi-Fi related messages are requested, the full log is too large to be useful
+            'command': (
+                'log show --info --debug --last 5m --predicate '
+                '\'subsystem BEGINSWITH[c] "com.apple.wifi" OR process == "airportd" '
+                'OR eventMessage CONTAINS[c] "80211"\''),
             'filename': 'log_show',
             'expressions': []
         },
@@ -147,7 +154,7 @@ def set_constants(adapter_name):
             'command': 'netstat -rn',
             'filename': 'netstat',
             'expressions': [
-                r'default.+en\d+',
+                r'default +\S+ +\S+ +en\d+',
             ]
         },
         'system_profiler': {
@@ -164,7 +171,7 @@ def set_constants(adapter_name):
                 r'Firmware Version: .+',
                 r'Supported Channels: .+',
                 r'Supported PHY Modes: .+',
-                r'Current Network Information:[\s\S]*MCS Index: \d+',
+                r'Current Network Information:[\s\S]{0,4096}?MCS Index: \d+',
                 r'"IO80211BSSID.+',
             ]
         },
@@ -173,9 +180,7 @@ def set_constants(adapter_name):
                 '/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/Resources/'
                 'airport -Is'),
             'filename': 'airport',
-            'expressions': [
-                r'[\s\S]*',
-            ]
+            'expressions': None
         },
         'known_networks': {
             'command': f'networksetup -listpreferredwirelessnetworks {adapter_name}',
@@ -193,7 +198,10 @@ def set_constants(adapter_name):
 
     diagnostics['linux'] = {
         'journalctl': {
-            'command': 'journalctl -S -10m',
+            # Only messages from the network stack and the kernel are requested
+            'command': (
+                'journalctl -S -10m '
+                '-t NetworkManager -t wpa_supplicant -t iwd -t systemd-networkd -t kernel'),
             'filename': 'log_journalctl',
             'expressions': []
         },
@@ -330,12 +338,12 @@ def set_constants(adapter_name):
         },
         'dl_throughput': {
             'id': 'dl_throughput',
-            'expressions': r'Down.+ capacity: (\S+ \S+)',
+            'expressions': r'Down\w* capacity: (\S+ \S+)',
             'description': 'DL throughput:',
         },
         'ul_throughput': {
             'id': 'ul_throughput',
-            'expressions': r'Up.+ capacity: (\S+ \S+)',
+            'expressions': r'Up\w* capacity: (\S+ \S+)',
             'description': 'UL throughput:',
         },
         'ssid': {
@@ -361,7 +369,7 @@ def set_constants(adapter_name):
         },
         'noise': {
             'id': 'noise',
-            'expressions': r'Signal / Noise: .+ / (\S+ dBm)',
+            'expressions': r'Signal / Noise: [^/\n]+ / (\S+ dBm)',
             'description': 'Noise:',
         },
         'channel': {
@@ -384,21 +392,6 @@ def set_constants(adapter_name):
             'expressions': r'Time since boot: (.+)',
             'description': 'Time since boot:',
         },
-        'ok': {
-            'id': 'ok',
-            'expressions': r'Command: (.*)\nOK',
-            'description': 'OK:',
-        },
-        'not_ok': {
-            'id': 'not_ok',
-            'expressions': r'Command: (.*)\nNot OK',
-            'description': 'Not OK:',
-        },
-        'error': {
-            'id': 'error',
-            'expressions': r'Command: (.*)\nError',
-            'description': 'Error:',
-        },
     }
 
     highlights_template['linux'] = {
@@ -509,21 +502,6 @@ def set_constants(adapter_name):
             'expressions': r'DRIVER: + (.*)',
             'description': 'Adapter driver:',
         },
-        'ok': {
-            'id': 'ok',
-            'expressions': r'Command: (.*)\nOK',
-            'description': 'OK:',
-        },
-        'not_ok': {
-            'id': 'not_ok',
-            'expressions': r'Command: (.*)\nNot OK',
-            'description': 'Not OK:',
-        },
-        'error': {
-            'id': 'error',
-            'expressions': r'Command: (.*)\nError',
-            'description': 'Error:',
-        },
     }
 
     constants = {
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yfitool
+
+
+def run_diagnostic(expressions, output):
+    # Runs printf as a diagnostic, so that get_diagnostics() searches exactly <output>
+    diagnostics = yfitool.split_commands({
+        'test': {
+            'argv': ('printf', '%s', output),
+            'filename': 'test',
+            'expressions': expressions,
+        }
+    })
+    _, diagnostics, _ = yfitool.compile_expressions({}, diagnostics, {})
+    task = diagnostics['test']
+
+    with tempfile.TemporaryDirectory() as subfolder_path:
+        os.mkdir(f'{subfolder_path}/{yfitool.DIAGS_FOLDER}')
+        results = yfitool.get_diagnostics(task, 'timestamp', subfolder_path)
+
+    return task, results['major_facts']
+
+
+class TestGetDiagnostics(unittest.TestCase):
+
+    def test_anchored_expression_on_bytes_path(self):
+        task, major_facts = run_diagnostic([r'^\S+', r'\Aen\d'], 'en0: flags=8863\nen1: flags=0\n')
+        self.assertIsNotNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'en0:\nen0')
+
+    def test_multiline_anchor_on_bytes_path(self):
+        task, major_facts = run_diagnostic([r'(?m)^en\d'], 'en0: flags=8863\nen1: flags=0\n')
+        self.assertIsNotNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'en0\nen1')
+
+    def test_crlf_output_is_searched_as_text(self):
+        task, major_facts = run_diagnostic([r'SSID: .+', r'^\S+'], 'SSID: home\r\nBSSID: 00:11\r\n')
+        self.assertIsNotNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'SSID: home\nSSID: 00:11\nSSID:')
+
+    def test_non_ascii_hex_escape_stays_str(self):
+        task, major_facts = run_diagnostic([r'caf\xe9'], 'café\n')
+        self.assertIsNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'café')
+
+    def test_unicode_escape_stays_str(self):
+        task, major_facts = run_diagnostic([r'caf\u00e9 \w+'], 'café open\n')
+        self.assertIsNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'café open')
+
+    def test_ascii_escape_on_bytes_path(self):
+        task, major_facts = run_diagnostic([r'\x41P: \S+'], 'AP: 00:11:22\n')
+        self.assertIsNotNone(task['byte_patterns'])
+        self.assertEqual(major_facts, 'AP: 00:11:22')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,26 +8,42 @@ The script's operating mode is defined by constants:
 FACTS, TESTS, SETTINGS, DIAGNOSTICS, HIGHLIGHTS_TEMPLATE.
 
 Those constants are assigned in set_constants() function.
-The exact same function also exists in an external configuration file.
+The built-in one puts them together from the configuration constants below.
+An external configuration file has its own set_constants(),
+which returns the same nested dictionaries, see "config_yfitool_example.py".
 If you want to tweak the script, the recommended way is to put any changes to
 the external configuration file. It will be loaded automatically
 if you name it "config_yfitool.py" and put it in the same directory as the main script.
 Or you can specify external config as an argument when starting the script:
 "python3 yfitool.py my_external_config"
 
-Only highlights are being sent to the output.
+While tests run, a "<command> - <result>" line is printed for every test task as it finishes.
+After that only highlights are being sent to the output.
 Make sure to check the FOLDER_NAME for a full report.
 """
 
+import os
+import pwd
+import socket
 import time
 import subprocess
+import shlex
+import platform
 import re
 import json
+import io
+import mmap
 import logging
-import importlib
+import logging.handlers
+import queue
+import atexit
+import functools
+import threading
 from datetime import datetime
+from types import MappingProxyType
+from collections import namedtuple, Counter
 from concurrent.futures import ThreadPoolExecutor
-from sys import argv,exit
+from sys import argv,exit,intern
 
 # Do not rename these constants - they are used for integration purposes
 
@@ -40,7 +56,33 @@ DEFAULT_EXTERNAL_CONFIG_FILE = 'config_yfitool'
 
 SUBPROCESS_TIMEOUT = 30
 THROUGHPUT_TEST_TIMEOUT = 60
-MAX_WORKERS = 5 # Number of threads to run simultaneously
+TCPDUMP_STOP_TIMEOUT = 2 # Seconds for tcpdump to write the file and exit after terminate()
+OS_TYPE = platform.system().lower() # 'darwin' or 'linux', the same as 'uname' output
+MAX_WORKERS = 20 # Number of threads to run simultaneously, one per diagnostic or test task
+REPORT_BUFFER_SIZE = 1 << 20 # Bytes buffered before the JSON report is written to disk, check make_json()
+REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()') # Expressions without them are plain text
+SPLIT_SETTINGS_SUFFIXES = ('_command', '_arguments', '_capabilities') # Checked by split_settings()
+SPLIT_EXPRESSION = r'\S+' # A diagnostic with only this expression gets str.split() instead
+NON_ASCII_ESCAPE_REGEX = re.compile(r'\\(?:x[89a-fA-F]|[23][0-7]{2}|[uUN])') # Checked by to_bytes_pattern()
+
+# Test results are gathered from the summary with a single scan, check parse_report()
+SUMMARY_STATUS_REGEX = re.compile(r'Command: (?P<command>.*)\n(?P<status>OK|Not OK|Error)')
+STATUS_TEMPLATE_IDS = ('ok', 'not_ok', 'error') # Replaced by SUMMARY_STATUS_REGEX
+
+# Throughput results, searched in the output of SETTINGS['throughput_command']
+THROUGHPUT_EXPRESSIONS = (
+    re.compile(r'Up\w* capacity: .+'),
+    re.compile(r'Down\w* capacity: .+'),
+    re.compile(r'Responsiveness: .+'),
+)
+
+# The first wireless interface in 'iw dev' output, check get_adapter_name()
+IFACE_REGEX = re.compile(r'Interface (\S+)')
+
+# Internal state shared by the functions below, it's not a part of the integration constants
+GATEWAY_LOCK = threading.Lock() # get_gateway() is called from several test threads
+PATTERN_CACHE = {} # Expression to compiled pattern, filled by compile_pattern() and to_bytes_pattern()
+LOG_QUEUE = queue.Queue() # Log records on their way to the log file, check initialize_system()
 
 # Here comes a long block of configuration constants assignment
 # Those constants will be used by read_config() during the script initialization
@@ -48,113 +90,420 @@ MAX_WORKERS = 5 # Number of threads to run simultaneously
 # Better apply all changes to external configuration file "config_yfitool.py"
 
 ### START OF CONFIGURATION CONSTANTS ASSIGNMENT ###
-
-def set_constants(adapter_name):
-    # Constants keys could be 'universal', 'darwin' or 'linux'
-    # The appropriate key will be automatically selected depending on your OS
-    facts = {}
-    tests = {}
-    settings = {}
-    diagnostics = {}
-    highlights_template = {}
-
-    facts['universal'] = {
+# A record per test; execute_task() reads its fields by attribute
+# <name> is used as the key in the tests report
+Test = namedtuple('Test', 'name target tasks filename')
+
+# TESTS are constants used by execute_task() function, one call per task of each test
+# Available 'tasks': 'ping ping6 traceroute traceroute6 curl curl6 route route6'
+# List them as a tuple, e.g. ('ping', 'curl')
+# '6' stands for IPv6-variant of the task
+# You may add or modify tests according to your needs
+UNIVERSAL_TESTS = (
+    Test('google_dns', '8.8.8.8', ('ping', 'route'), '8888'),
+    Test('google_com', 'google.com', ('ping', 'ping6', 'curl', 'curl6'), 'googlecom'),
+    Test('facebook', 'facebook.com', ('ping', 'ping6', 'curl', 'curl6'), 'facebook'),
+    Test('youtube', 'youtube.com', ('ping', 'ping6', 'curl', 'curl6'), 'youtube'),
+    Test('the_wlpc', 'thewlpc.com', ('ping', 'curl', 'traceroute'), 'wlpc'),
+    # 'gateway' is treated in a special way, check test_ping()
+    # don't change 'gw_placeholder'
+    Test('gateway', 'gw_placeholder', ('ping', 'ping6'), 'gateway'),
+)
+
+
+# Settings and diagnostics that are the same for every OS and adapter
+# They are built once at import and merged into the per-OS constants
+COMMON_SETTINGS = {
+    'traceroute_arguments': ('-I',),
+    'curl_ipv4_command': ('curl', '-4Is'),
+    'curl_ipv6_command': ('curl', '-6Is'),
+    'tcpdump_timeout': 30,
+    'tcpdump_output_filter': 'icmp6 && ip6[40] == 134',
+}
+
+PUBLIC_IP_DIAGNOSTIC = {
+    'argv': ('curl', '-s', 'ifconfig.me'),
+    'filename': 'public_ip',
+    'expressions': [
+        r'\S+',
+    ]
+}
+
+# DIAGNOSTICS are constants used by get_diagnostics() function
+# 'expressions': None puts the whole output to the summary, [] puts nothing
+# 'argv' is a ready argument list, it's executed without a shell
+# A 'command' string is accepted as well, it's split once when the config is read
+# Diagnostics for darwin that do not depend on the adapter name
+DARWIN_DIAGNOSTICS = {
+    'log_show': {
+        # Only Wi-Fi related messages are requested, the full log is too large to be useful
+        'argv': (
+            'log', 'show', '--info', '--debug', '--last', '5m', '--predicate',
+            'subsystem BEGINSWITH[c] "com.apple.wifi" OR process == "airportd" '
+            'OR eventMessage CONTAINS[c] "80211"'),
+        'filename': 'log_show',
+        'expressions': []
+    },
+    'public_ip': PUBLIC_IP_DIAGNOSTIC,
+    'gateway_ipv4': {
+        'argv': ('route', 'get', 'default'),
+        'filename': 'gateway4',
+        'expressions': [
+            r'gateway: \S+',
+        ]
+    },
+    'gateway_ipv6': {
+        'argv': ('route', '-n', 'get', '-inet6', 'default'),
+        'filename': 'gateway6',
+        'expressions': [
+            r'gateway: \S+',
+        ]
+    },
+    'netstat': {
+        'argv': ('netstat', '-rn'),
+        'filename': 'netstat',
+        'expressions': [
+            r'default +\S+ +\S+ +en\d+',
+        ]
+    },
+    'system_profiler': {
+        'argv': (
+            'system_profiler',
+            'SPAirPortDataType', 'SPHardwareDataType', 'SPSoftwareDataType', 'SPLogsDataType'),
+        'filename': 'system_profiler',
+        'expressions': [
+            r'Computer Name: .+',
+            r'User Name: .+',
+            r'System Version: .+',
+            r'Time since boot: .+',
+            r'Card Type: .+',
+            r'Firmware Version: .+',
+            r'Supported Channels: .+',
+            r'Supported PHY Modes: .+',
+            r'Current Network Information:[\s\S]{0,4096}?MCS Index: \d+',
+            r'"IO80211BSSID.+',
+        ]
+    },
+    'airport': {
+        'argv': (
+            '/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/Resources/'
+            'airport', '-Is'),
+        'filename': 'airport',
+        'expressions': None
+    },
+    'wdutil': {
+        'argv': ('wdutil', 'info'),
+        'filename': 'wdutil',
+        'expressions': []
+    },
+}
+
+# Template for gathering the most important info from the summary
+# Highlights will be presented in the same order they go in this dictionary
+DARWIN_HIGHLIGHTS_TEMPLATE = {
+    'username': {
+        'id': 'username',
+        'expressions': r'User Name: (.+)',
+        'description': 'Started by:',
+    },
+    'mac_address': {
+        'id': 'mac_address',
+        'expressions': r'ether (\S+)',
+        'description': 'MAC address:',
+    },
+    'ipv4_address': {
+        'id': 'ipv4_address',
+        'expressions': r'inet (\S+) netmask',
+        'description': 'IPv4 address:',
+    },
+    'ipv6_address': {
+        'id': 'ipv6_address',
+        'expressions': r'inet6 (\S+:[0-9a-f]*) ',
+        'description': 'IPv6 address:',
+    },
+    'ra_received': {
+        'id': 'ra_received',
+        'expressions': r'ff02::1: ICMP6, router advertisement',
+        'description': 'RA messages received:',
+    },
+    'dl_throughput': {
+        'id': 'dl_throughput',
+        'expressions': r'Down\w* capacity: (\S+ \S+)',
+        'description': 'DL throughput:',
+    },
+    'ul_throughput': {
+        'id': 'ul_throughput',
+        'expressions': r'Up\w* capacity: (\S+ \S+)',
+        'description': 'UL throughput:',
+    },
+    'ssid': {
+        'id': 'ssid',
+        'expressions': r' SSID: (.+)',
+        'description': 'SSID:',
+    },
+    # # You need sudo to get BSSID value from airport
+    # 'bssid_from_airport': {
+    #     'id': 'bssid_from_airport',
+    #     'expressions': r'BSSID: (\S+:\S+:\S+:\S+:\S+)\n.*SSID',
+    #     'description': 'BSSID from airport:',
+    # },
+    'bssid_from_logs': {
+        'id': 'bssid_from_logs',
+        'expressions': r'"IO80211BSSID" = <(\S+)>',
+        'description': 'BSSID:',
+    },
+    'rssi': {
+        'id': 'rssi',
+        'expressions': r'Signal / Noise: (\S+ dBm)',
+        'description': 'RSSI:',
+    },
+    'noise': {
+        'id': 'noise',
+        'expressions': r'Signal / Noise: [^/\n]+ / (\S+ dBm)',
+        'description': 'Noise:',
+    },
+    'channel': {
+        'id': 'channel',
+        'expressions': r'Channel: (\d+)',
+        'description': 'Channel:',
+    },
+    'computer_name': {
+        'id': 'computer_name',
+        'expressions': r'Computer Name: (.+)',
+        'description': 'Computer Name:',
+    },
+    'macos_version': {
+        'id': 'macos_version',
+        'expressions': r'System Version: (.+)',
+        'description': 'System Version:',
+    },
+    'time_since_boot': {
+        'id': 'time_since_boot',
+        'expressions': r'Time since boot: (.+)',
+        'description': 'Time since boot:',
+    },
+}
+
+
+# Diagnostics for linux that do not depend on the adapter name
+LINUX_DIAGNOSTICS = {
+    'journalctl': {
+        # Only messages from the network stack and the kernel are requested
+        'argv': (
+            'journalctl', '-S', '-10m',
+            '-t', 'NetworkManager', '-t', 'wpa_supplicant', '-t', 'iwd',
+            '-t', 'systemd-networkd', '-t', 'kernel'),
+        'filename': 'log_journalctl',
+        'expressions': []
+    },
+    'public_ip': PUBLIC_IP_DIAGNOSTIC,
+    'ip_route_table': {
+        'argv': ('ip', 'route', 'show', 'table', 'all'),
+        'filename': 'ip_route_table',
+        'expressions': [
+            r'default via \S+ dev \S+',
+        ]
+    },
+    'user_login': {
+        'argv': ('id',),
+        'filename': 'user_login',
+        'expressions': [
+            r'uid=\S+',
+        ]
+    },
+    'boot_time': {
+        'argv': ('who', '-b'),
+        'filename': 'boot_time',
+        'expressions': [
+            r'system boot.+'
+        ]
+    },
+    'iw_dev': {
+        'argv': ('iw', 'dev'),
+        'filename': 'iw_dev',
+        'expressions': [
+            r'ssid .+',
+            r'channel .+',
+        ]
+    },
+    'hostnamectl': {
+        'argv': ('hostnamectl',),
+        'filename': 'hostnamectl',
+        'expressions': [
+            r'Static hostname: \S+',
+            r'Operating System: .*',
+            r'Kernel: .*',
+            r'Architecture: \S+',
+            r'Hardware Vendor: .*',
+            r'Hardware Model: .*',
+        ]
+    },
+    'wifi_list': {
+        'argv': ('nmcli', 'device', 'wifi', 'list'),
+        'filename': 'wifi_list',
+        'expressions': []
+    },
+}
+
+LINUX_HIGHLIGHTS_TEMPLATE = {
+    'mac_address': {
+        'id': 'mac_address',
+        'expressions': r'ether (\S+)',
+        'description': 'MAC address:',
+    },
+    'ipv4_address': {
+        'id': 'ipv4_address',
+        'expressions': r'inet (\S+)/.{,2} brd',
+        'description': 'IPv4 address:',
+    },
+    'ipv6_address': {
+        'id': 'ipv6_address',
+        'expressions': r'inet6 (\S+:[0-9a-f]*)(?=/.{,2})',
+        'description': 'IPv6 address:',
+    },
+    'ra_received': {
+        'id': 'ra_received',
+        'expressions': r'ip6-allnodes: ICMP6, router advertisement',
+        'description': 'RA messages received:',
+    },
+    # Throughput test for linux is not yet supported
+    # So next two entries are just placeholders
+    'dl_throughput': {
+        'id': 'dl_throughput',
+        'expressions': r'Nonexistent pattern placeholder: (\S+ \S+)',
+        'description': 'DL throughput:',
+    },
+    'ul_throughput': {
+        'id': 'ul_throughput',
+        'expressions': r'Nonexistent pattern placeholder: (\S+ \S+)',
+        'description': 'UL throughput:',
+    },
+    'ssid': {
+        'id': 'ssid',
+        'expressions': r'ssid (.+)',
+        'description': 'SSID:',
+    },
+    'bssid': {
+        'id': 'bssid',
+        'expressions': r'Access Point: (\S+)',
+        'description': 'BSSID:',
+    },
+    'signal_level': {
+        'id': 'signal_level',
+        'expressions': r'Signal level=(\S+) dBm',
+        'description': 'Signal level:',
+    },
+    'link_quality': {
+        'id': 'link_quality',
+        'expressions': r'Link Quality=(\S+)',
+        'description': 'Link Quality:',
+    },
+    'channel': {
+        'id': 'channel',
+        'expressions': r'channel (.+)',
+        'description': 'Channel:',
+    },
+    'computer_name': {
+        'id': 'computer_name',
+        'expressions': r'Static hostname: (\S+)',
+        'description': 'Computer Name:',
+    },
+    'user_login': {
+        'id': 'user_login',
+        'expressions': r'uid=\d+\((\S+)\)',
+        'description': 'Login:',
+    },
+    'boot_time': {
+        'id': 'boot_time',
+        'expressions': r'system boot + (.*)',
+        'description': 'Boot time:'
+    },
+    'os_version': {
+        'id': 'os_version',
+        'expressions': r'Operating System: (.*)',
+        'description': 'OS version:',
+    },
+    'kernel': {
+        'id': 'kernel',
+        'expressions': r'Kernel: (.*)',
+        'description': 'Kernel:',
+    },
+    'hardware_name': {
+        'id': 'hardware_name',
+        'expressions': r'Hardware Vendor: (.*)',
+        'description': 'Hardware vendor:',
+    },
+    'hardware_model': {
+        'id': 'hardware_model',
+        'expressions': r'Hardware Model: (.*)',
+        'description': 'Hardware model:',
+    },
+    'adapter_vendor': {
+        'id': 'adapter_vendor',
+        'expressions': r'VENDOR: + (.*)',
+        'description': 'Adapter vendor:',
+    },
+    'adapter_model': {
+        'id': 'adapter_model',
+        'expressions': r'PRODUCT: + (.*)',
+        'description': 'Adapter model:',
+    },
+    'adapter_driver': {
+        'id': 'adapter_diver',
+        'expressions': r'DRIVER: + (.*)',
+        'description': 'Adapter driver:',
+    },
+}
+
+
+def set_universal_constants():
+    facts = {
         'supported_systems': ['darwin', 'linux']
     }
 
-    # TESTS are constants used by execute_test() function
-    # Available 'tasks': 'ping ping6 traceroute traceroute6 curl curl6 route route6'
-    # '6' stands for IPv6-variant of the task
-    # You may add or modify tests according to your needs
-
-    tests['universal'] = {
-        'google_dns': {
-            'target': '8.8.8.8',
-            'tasks': 'ping route',
-            'filename': '8888'
-        },
-        'google_com': {
-            'target': 'google.com',
-            'tasks': 'ping ping6 curl curl6',
-            'filename': 'googlecom'
-        },
-        'facebook': {
-            'target': 'facebook.com',
-            'tasks': 'ping ping6 curl curl6',
-            'filename': 'facebook'
-        },
-        'youtube': {
-            'target': 'youtube.com',
-            'tasks': 'ping ping6 curl curl6',
-            'filename': 'youtube'
-        },
-        'the_wlpc': {
-            'target': 'thewlpc.com',
-            'tasks': 'ping curl traceroute',
-            'filename': 'wlpc'
-        },
-        # 'gateway' is treated in a special way, check test_ping()
-        'gateway': {
-            'target': 'gw_placeholder', # don't change 'gw_placeholder'
-            'tasks': 'ping ping6',
-            'filename': 'gateway'
-        },
+    return {
+        'facts': facts,
+        'tests': UNIVERSAL_TESTS,
     }
 
+
+def set_darwin_constants(adapter_name):
     # General settings
-    settings['darwin'] = {
-        'ping_arguments': '--apple-time -c 20',
+    settings = {
+        **COMMON_SETTINGS,
+        'ping_arguments': ('--apple-time', '-c', '20'),
         'good_ping_pattern': ' 0.0% packet loss',
-        'traceroute_arguments': '-I',
-        'route_get_ipv4_command': 'route -vn get',
-        'route_get_ipv6_command': 'route -vn get -inet6',
-        'curl_ipv4_command': 'curl -4Is',
-        'curl_ipv6_command': 'curl -6Is',
-        'get_gateway_ipv4_command': 'netstat -rn',
-        'get_gateway_ipv6_command': 'netstat -rn',
-
-        'gateway_ipv4_regex': rf'default +(\d+.\d+.\d+.\d+) +\S+ +{adapter_name}',
-        'gateway_ipv6_regex': rf'default +(\S+:\S+) + +\S+ +{adapter_name}',
-
-        'tcpdump_command': f'tcpdump -i {adapter_name} -W 1 -G 90 -w',
-        'tcpdump_check_capabilities': f'tcpdump -i {adapter_name} -c 1',
-        'tcpdump_timeout': 30,
-        'tcpdump_output_filter': 'icmp6 && ip6[40] == 134',
-
-        'throughput_command': 'networkQuality',
-    }
+        'route_get_ipv4_command': ('route', '-vn', 'get'),
+        'route_get_ipv6_command': ('route', '-vn', 'get', '-inet6'),
+        'get_gateway_ipv4_command': ('netstat', '-rn'),
+        'get_gateway_ipv6_command': ('netstat', '-rn'),
 
-    settings['linux'] = {
-        'ping_arguments': '-c 20',
-        'good_ping_pattern': ' 0% packet loss',
-        'traceroute_arguments': '-I',
-        'route_get_ipv4_command': 'ip route get',
-        'route_get_ipv6_command': 'ip -6 route get',
-        'curl_ipv4_command': 'curl -4Is',
-        'curl_ipv6_command': 'curl -6Is',
-        'get_gateway_ipv4_command': 'ip -4 route list',
-        'get_gateway_ipv6_command': 'ip -6 route list',
+        # Compiled right here, as they are the only patterns that depend on the adapter name
+        'gateway_ipv4_regex': compile_pattern(
+            rf'default +(\d+\.\d+\.\d+\.\d+) +\S+ +{re.escape(adapter_name)}'),
+        'gateway_ipv6_regex': compile_pattern(
+            rf'default +(\S+:\S+) + +\S+ +{re.escape(adapter_name)}'),
 
-        'gateway_ipv4_regex': r'default via (\S+)',
-        'gateway_ipv6_regex': r'default via (\S+)',
+        'tcpdump_command': ('tcpdump', '-i', adapter_name, '-W', '1', '-G', '90', '-w'),
+        'tcpdump_check_capabilities': ('tcpdump', '-i', adapter_name, '-c', '1'),
 
-        'tcpdump_command': f'tcpdump -i {adapter_name} -W 1 -G 90 -w',
-        'tcpdump_check_capabilities': f'tcpdump -i {adapter_name} -c 1',
-        'tcpdump_timeout': 30,
-        'tcpdump_output_filter': 'icmp6 && ip6[40] == 134',
+        'throughput_command': ('networkQuality',),
+    }
 
-        'throughput_command': None, # Not supported yet
+    return {
+        'settings': settings,
+        'diagnostics': set_darwin_diagnostics(adapter_name),
+        'highlights_template': DARWIN_HIGHLIGHTS_TEMPLATE,
     }
 
-    # DIAGNOSTICS are constants used by get_diagnostics() function
-    diagnostics['darwin'] = {
-        'log_show': {
-            'command': 'log show --info --debug --last 5m',
-            'filename': 'log_show',
-            'expressions': []
-        },
+
+def set_darwin_diagnostics(adapter_name):
+    # Adapter-dependent diagnostics are spliced in between the static ones
+    # to keep the order they appear in the report
+    diagnostics = {
+        'log_show': DARWIN_DIAGNOSTICS['log_show'],
         'ifconfig': {
-            'command': f'ifconfig {adapter_name}',
+            'argv': ('ifconfig', adapter_name),
             'filename': 'ifconfig',
             'expressions': [
                 r'ether \S+',
@@ -162,83 +511,56 @@ def set_constants(adapter_name):
                 r'inet .+',
             ]
         },
-        'public_ip': {
-            'command': 'curl -s ifconfig.me',
-            'filename': 'public_ip',
-            'expressions': [
-                r'\S+',
-            ]
-        },
-        'gateway_ipv4': {
-            'command': 'route get default',
-            'filename': 'gateway4',
-            'expressions': [
-                r'gateway: \S+',
-            ]
-        },
-        'gateway_ipv6': {
-            'command': 'route -n get -inet6 default',
-            'filename': 'gateway6',
-            'expressions': [
-                r'gateway: \S+',
-            ]
-        },
-        'netstat': {
-            'command': 'netstat -rn',
-            'filename': 'netstat',
-            'expressions': [
-                r'default.+en\d+',
-            ]
-        },
-        'system_profiler': {
-            'command': (
-                'system_profiler '
-                'SPAirPortDataType SPHardwareDataType SPSoftwareDataType SPLogsDataType'),
-            'filename': 'system_profiler',
-            'expressions': [
-                r'Computer Name: .+',
-                r'User Name: .+',
-                r'System Version: .+',
-                r'Time since boot: .+',
-                r'Card Type: .+',
-                r'Firmware Version: .+',
-                r'Supported Channels: .+',
-                r'Supported PHY Modes: .+',
-                r'Current Network Information:[\s\S]*MCS Index: \d+',
-                r'"IO80211BSSID.+',
-            ]
-        },
-        'airport': {
-            'command': (
-                '/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/Resources/'
-                'airport -Is'),
-            'filename': 'airport',
-            'expressions': [
-                r'[\s\S]*',
-            ]
-        },
+        'public_ip': DARWIN_DIAGNOSTICS['public_ip'],
+        'gateway_ipv4': DARWIN_DIAGNOSTICS['gateway_ipv4'],
+        'gateway_ipv6': DARWIN_DIAGNOSTICS['gateway_ipv6'],
+        'netstat': DARWIN_DIAGNOSTICS['netstat'],
+        'system_profiler': DARWIN_DIAGNOSTICS['system_profiler'],
+        'airport': DARWIN_DIAGNOSTICS['airport'],
         'known_networks': {
-            'command': f'networksetup -listpreferredwirelessnetworks {adapter_name}',
+            'argv': ('networksetup', '-listpreferredwirelessnetworks', adapter_name),
             'filename': 'known_networks',
             'expressions': [
                 r'	(.+)',
             ]
         },
-        'wdutil': {
-            'command': 'wdutil info',
-            'filename': 'wdutil',
-            'expressions': []
-        },
+        'wdutil': DARWIN_DIAGNOSTICS['wdutil'],
     }
 
-    diagnostics['linux'] = {
-        'journalctl': {
-            'command': 'journalctl -S -10m',
-            'filename': 'log_journalctl',
-            'expressions': []
-        },
+    return diagnostics
+
+
+def set_linux_constants(adapter_name):
+    settings = {
+        **COMMON_SETTINGS,
+        'ping_arguments': ('-c', '20'),
+        'good_ping_pattern': ' 0% packet loss',
+        'route_get_ipv4_command': ('ip', 'route', 'get'),
+        'route_get_ipv6_command': ('ip', '-6', 'route', 'get'),
+        'get_gateway_ipv4_command': ('ip', '-4', 'route', 'list'),
+        'get_gateway_ipv6_command': ('ip', '-6', 'route', 'list'),
+
+        'gateway_ipv4_regex': r'default via (\S+)',
+        'gateway_ipv6_regex': r'default via (\S+)',
+
+        'tcpdump_command': ('tcpdump', '-i', adapter_name, '-W', '1', '-G', '90', '-w'),
+        'tcpdump_check_capabilities': ('tcpdump', '-i', adapter_name, '-c', '1'),
+
+        'throughput_command': None, # Not supported yet
+    }
+
+    return {
+        'settings': settings,
+        'diagnostics': set_linux_diagnostics(adapter_name),
+        'highlights_template': LINUX_HIGHLIGHTS_TEMPLATE,
+    }
+
+
+def set_linux_diagnostics(adapter_name):
+    diagnostics = {
+        'journalctl': LINUX_DIAGNOSTICS['journalctl'],
         'ip_addr': {
-            'command': f'ip addr show {adapter_name}',
+            'argv': ('ip', 'addr', 'show', adapter_name),
             'filename': 'ip_addr',
             'expressions': [
                 r'ether \S+',
@@ -246,58 +568,27 @@ def set_constants(adapter_name):
                 r'inet .+',
             ]
         },
-        'public_ip': {
-            'command': 'curl -s ifconfig.me',
-            'filename': 'public_ip',
-            'expressions': [
-                r'\S+',
-            ]
-        },
+        'public_ip': LINUX_DIAGNOSTICS['public_ip'],
         'gateway_ipv4': {
-            'command': f'ip -4 route list type unicast dev {adapter_name}',
+            'argv': ('ip', '-4', 'route', 'list', 'type', 'unicast', 'dev', adapter_name),
             'filename': 'gateway4',
             'expressions': [
                 r'default via \S+',
             ]
         },
         'gateway_ipv6': {
-            'command': f'ip -6 route list type unicast dev {adapter_name}',
+            'argv': ('ip', '-6', 'route', 'list', 'type', 'unicast', 'dev', adapter_name),
             'filename': 'gateway6',
             'expressions': [
                 r'default via \S+',
             ]
         },
-        'ip_route_table': {
-            'command': 'ip route show table all',
-            'filename': 'ip_route_table',
-            'expressions': [
-                r'default via \S+ dev \S+',
-            ]
-        },
-        'user_login': {
-            'command': 'id',
-            'filename': 'user_login',
-            'expressions': [
-                r'uid=\S+',
-            ]
-        },
-        'boot_time': {
-            'command': 'who -b',
-            'filename': 'boot_time',
-            'expressions': [
-                r'system boot.+'
-            ]
-        },
-        'iw_dev': {
-            'command': 'iw dev',
-            'filename': 'iw_dev',
-            'expressions': [
-                r'ssid .+',
-                r'channel .+',
-            ]
-        },
+        'ip_route_table': LINUX_DIAGNOSTICS['ip_route_table'],
+        'user_login': LINUX_DIAGNOSTICS['user_login'],
+        'boot_time': LINUX_DIAGNOSTICS['boot_time'],
+        'iw_dev': LINUX_DIAGNOSTICS['iw_dev'],
         'iwconfig': {
-            'command': f'iwconfig {adapter_name}',
+            'argv': ('iwconfig', adapter_name),
             'filename': 'iwconfig',
             'expressions': [
                 r'Access Point: \S+',
@@ -306,24 +597,13 @@ def set_constants(adapter_name):
             ]
         },
         'supported_channels': {
-            'command': f'iwlist {adapter_name} channel',
+            'argv': ('iwlist', adapter_name, 'channel'),
             'filename': 'supported_channels',
             'expressions': []
         },
-        'hostnamectl': {
-            'command': 'hostnamectl',
-            'filename': 'hostnamectl',
-            'expressions': [
-                r'Static hostname: \S+',
-                r'Operating System: .*',
-                r'Kernel: .*',
-                r'Architecture: \S+',
-                r'Hardware Vendor: .*',
-                r'Hardware Model: .*',
-            ]
-        },
+        'hostnamectl': LINUX_DIAGNOSTICS['hostnamectl'],
         'adapter_info': {
-            'command': f'nmcli -f GENERAL dev show {adapter_name}',
+            'argv': ('nmcli', '-f', 'GENERAL', 'dev', 'show', adapter_name),
             'filename': 'adapter_info',
             'expressions': [
                 r'DEVICE:.+',
@@ -333,248 +613,43 @@ def set_constants(adapter_name):
                 r'DRIVER-VERSION:.+',
             ]
         },
-        'wifi_list': {
-            'command': 'nmcli device wifi list',
-            'filename': 'wifi_list',
-            'expressions': []
-        },
+        'wifi_list': LINUX_DIAGNOSTICS['wifi_list'],
     }
 
-    # Template for gathering the most important info from the summary
-    # Highlights will be presented in the same order they go in this dictionary
-    highlights_template['darwin'] = {
-        'username': {
-            'id': 'username',
-            'expressions': r'User Name: (.+)',
-            'description': 'Started by:',
-        },
-        'mac_address': {
-            'id': 'mac_address',
-            'expressions': r'ether (\S+)',
-            'description': 'MAC address:',
-        },
-        'ipv4_address': {
-            'id': 'ipv4_address',
-            'expressions': r'inet (\S+) netmask',
-            'description': 'IPv4 address:',
-        },
-        'ipv6_address': {
-            'id': 'ipv6_address',
-            'expressions': r'inet6 (\S+:[0-9a-f]*) ',
-            'description': 'IPv6 address:',
-        },
-        'ra_received': {
-            'id': 'ra_received',
-            'expressions': r'ff02::1: ICMP6, router advertisement',
-            'description': 'RA messages received:',
-        },
-        'dl_throughput': {
-            'id': 'dl_throughput',
-            'expressions': r'Down.+ capacity: (\S+ \S+)',
-            'description': 'DL throughput:',
-        },
-        'ul_throughput': {
-            'id': 'ul_throughput',
-            'expressions': r'Up.+ capacity: (\S+ \S+)',
-            'description': 'UL throughput:',
-        },
-        'ssid': {
-            'id': 'ssid',
-            'expressions': r' SSID: (.+)',
-            'description': 'SSID:',
-        },
-        # # You need sudo to get BSSID value from airport
-        # 'bssid_from_airport': {
-        #     'id': 'bssid_from_airport',
-        #     'expressions': r'BSSID: (\S+:\S+:\S+:\S+:\S+)\n.*SSID',
-        #     'description': 'BSSID from airport:',
-        # },
-        'bssid_from_logs': {
-            'id': 'bssid_from_logs',
-            'expressions': r'"IO80211BSSID" = <(\S+)>',
-            'description': 'BSSID:',
-        },
-        'rssi': {
-            'id': 'rssi',
-            'expressions': r'Signal / Noise: (\S+ dBm)',
-            'description': 'RSSI:',
-        },
-        'noise': {
-            'id': 'noise',
-            'expressions': r'Signal / Noise: .+ / (\S+ dBm)',
-            'description': 'Noise:',
-        },
-        'channel': {
-            'id': 'channel',
-            'expressions': r'Channel: (\d+)',
-            'description': 'Channel:',
-        },
-        'computer_name': {
-            'id': 'computer_name',
-            'expressions': r'Computer Name: (.+)',
-            'description': 'Computer Name:',
-        },
-        'macos_version': {
-            'id': 'macos_version',
-            'expressions': r'System Version: (.+)',
-            'description': 'System Version:',
-        },
-        'time_since_boot': {
-            'id': 'time_since_boot',
-            'expressions': r'Time since boot: (.+)',
-            'description': 'Time since boot:',
-        },
-        'ok': {
-            'id': 'ok',
-            'expressions': r'Command: (.*)\nOK',
-            'description': 'OK:',
-        },
-        'not_ok': {
-            'id': 'not_ok',
-            'expressions': r'Command: (.*)\nNot OK',
-            'description': 'Not OK:',
-        },
-        'error': {
-            'id': 'error',
-            'expressions': r'Command: (.*)\nError',
-            'description': 'Error:',
-        },
-    }
+    return diagnostics
 
-    highlights_template['linux'] = {
-        'mac_address': {
-            'id': 'mac_address',
-            'expressions': r'ether (\S+)',
-            'description': 'MAC address:',
-        },
-        'ipv4_address': {
-            'id': 'ipv4_address',
-            'expressions': r'inet (\S+)/.{,2} brd',
-            'description': 'IPv4 address:',
-        },
-        'ipv6_address': {
-            'id': 'ipv6_address',
-            'expressions': r'inet6 (\S+:[0-9a-f]*)(?=/.{,2})',
-            'description': 'IPv6 address:',
-        },
-        'ra_received': {
-            'id': 'ra_received',
-            'expressions': r'ip6-allnodes: ICMP6, router advertisement',
-            'description': 'RA messages received:',
-        },
-        # Throughput test for linux is not yet supported
-        # So next two entries are just placeholders
-        'dl_throughput': {
-            'id': 'dl_throughput',
-            'expressions': r'Nonexistent pattern placeholder: (\S+ \S+)',
-            'description': 'DL throughput:',
-        },
-        'ul_throughput': {
-            'id': 'ul_throughput',
-            'expressions': r'Nonexistent pattern placeholder: (\S+ \S+)',
-            'description': 'UL throughput:',
-        },
-        'ssid': {
-            'id': 'ssid',
-            'expressions': r'ssid (.+)',
-            'description': 'SSID:',
-        },
-        'bssid': {
-            'id': 'bssid',
-            'expressions': r'Access Point: (\S+)',
-            'description': 'BSSID:',
-        },
-        'signal_level': {
-            'id': 'signal_level',
-            'expressions': r'Signal level=(\S+) dBm',
-            'description': 'Signal level:',
-        },
-        'link_quality': {
-            'id': 'link_quality',
-            'expressions': r'Link Quality=(\S+)',
-            'description': 'Link Quality:',
-        },
-        'channel': {
-            'id': 'channel',
-            'expressions': r'channel (.+)',
-            'description': 'Channel:',
-        },
-        'computer_name': {
-            'id': 'computer_name',
-            'expressions': r'Static hostname: (\S+)',
-            'description': 'Computer Name:',
-        },
-        'user_login': {
-            'id': 'user_login',
-            'expressions': r'uid=\d+\((\S+)\)',
-            'description': 'Login:',
-        },
-        'boot_time': {
-            'id': 'boot_time',
-            'expressions': r'system boot + (.*)',
-            'description': 'Boot time:'
-        },
-        'os_version': {
-            'id': 'os_version',
-            'expressions': r'Operating System: (.*)',
-            'description': 'OS version:',
-        },
-        'kernel': {
-            'id': 'kernel',
-            'expressions': r'Kernel: (.*)',
-            'description': 'Kernel:',
-        },
-        'hardware_name': {
-            'id': 'hardware_name',
-            'expressions': r'Hardware Vendor: (.*)',
-            'description': 'Hardware vendor:',
-        },
-        'hardware_model': {
-            'id': 'hardware_model',
-            'expressions': r'Hardware Model: (.*)',
-            'description': 'Hardware model:',
-        },
-        'adapter_vendor': {
-            'id': 'adapter_vendor',
-            'expressions': r'VENDOR: + (.*)',
-            'description': 'Adapter vendor:',
-        },
-        'adapter_model': {
-            'id': 'adapter_model',
-            'expressions': r'PRODUCT: + (.*)',
-            'description': 'Adapter model:',
-        },
-        'adapter_driver': {
-            'id': 'adapter_diver',
-            'expressions': r'DRIVER: + (.*)',
-            'description': 'Adapter driver:',
-        },
-        'ok': {
-            'id': 'ok',
-            'expressions': r'Command: (.*)\nOK',
-            'description': 'OK:',
-        },
-        'not_ok': {
-            'id': 'not_ok',
-            'expressions': r'Command: (.*)\nNot OK',
-            'description': 'Not OK:',
-        },
-        'error': {
-            'id': 'error',
-            'expressions': r'Command: (.*)\nError',
-            'description': 'Error:',
-        },
-    }
+
+def freeze(obj):
+    # Turn nested dicts into read-only MappingProxyType views and lists into tuples,
+    # so that constants can be safely cached and shared between worker threads
+    if isinstance(obj, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+@functools.lru_cache(maxsize=4)
+def set_constants(adapter_name):
+    # Constants keys could be 'universal', 'darwin' or 'linux'
+    # The appropriate key will be automatically selected depending on your OS
+    # The result is cached per adapter and shared between callers, that's why it's frozen
+    universal = set_universal_constants()
+    darwin = set_darwin_constants(adapter_name)
+    linux = set_linux_constants(adapter_name)
 
     constants = {
-        'facts': facts,
-        'tests': tests,
-        'settings': settings,
-        'diagnostics': diagnostics,
-        'highlights_template': highlights_template
+        'facts': {'universal': universal['facts']},
+        'tests': {'universal': universal['tests']},
+        'settings': {'darwin': darwin['settings'], 'linux': linux['settings']},
+        'diagnostics': {'darwin': darwin['diagnostics'], 'linux': linux['diagnostics']},
+        'highlights_template': {
+            'darwin': darwin['highlights_template'],
+            'linux': linux['highlights_template'],
+        },
     }
 
-    return constants
+    return freeze(constants)
 
 ### END OF CONFIGURATION CONSTANTS ASSIGNMENT ###
 
@@ -589,14 +664,15 @@ def test_ping(task, target):
     # In case target is a gateway, we need to determine its address first
     if target == 'gw_placeholder' and task == 'ping':
         gateway_ipv4, _ = get_gateway()
-        command_to_execute = f"{task} {SETTINGS['ping_arguments']} {gateway_ipv4}"
+        arguments = (task, *SETTINGS['ping_arguments'], gateway_ipv4)
     elif target == 'gw_placeholder' and task == 'ping6':
         _, gateway_ipv6 = get_gateway()
-        command_to_execute = f"{task} {SETTINGS['ping_arguments']} {gateway_ipv6}"
+        arguments = (task, *SETTINGS['ping_arguments'], gateway_ipv6)
     else:
-        command_to_execute = f"{task} {SETTINGS['ping_arguments']} {target}"
+        arguments = (task, *SETTINGS['ping_arguments'], target)
 
-    test_result, test_output = run_subprocess(command_to_execute)
+    command_to_execute = join_command(arguments)
+    test_result, test_output = run_subprocess(arguments)
     if SETTINGS['good_ping_pattern'] not in test_output:
         test_result = "Not OK"
 
@@ -604,27 +680,30 @@ def test_ping(task, target):
 
 
 def test_traceroute(task, target):
-    command_to_execute = f"{task} {SETTINGS['traceroute_arguments']} {target}"
+    arguments = (task, *SETTINGS['traceroute_arguments'], target)
 
-    test_result, test_output = run_subprocess(command_to_execute)
+    command_to_execute = join_command(arguments)
+    test_result, test_output = run_subprocess(arguments)
     return command_to_execute, test_result, test_output
 
 
 def test_curl(task, target):
     if task == 'curl':
-        command_to_execute = f"{SETTINGS['curl_ipv4_command']} http://{target}"
+        arguments = (*SETTINGS['curl_ipv4_command'], f"http://{target}")
     elif task == 'curl6':
-        command_to_execute = f"{SETTINGS['curl_ipv6_command']} http://{target}"
-    test_result, test_output = run_subprocess(command_to_execute)
+        arguments = (*SETTINGS['curl_ipv6_command'], f"http://{target}")
+    command_to_execute = join_command(arguments)
+    test_result, test_output = run_subprocess(arguments)
     return command_to_execute, test_result, test_output
 
 
 def test_get_route(task, target):
     if task == 'route':
-        command_to_execute = f"{SETTINGS['route_get_ipv4_command']} {target}"
+        arguments = (*SETTINGS['route_get_ipv4_command'], target)
     elif task == 'route6':
-        command_to_execute = f"{SETTINGS['route_get_ipv6_command']} {target}"
-    test_result, test_output = run_subprocess(command_to_execute)
+        arguments = (*SETTINGS['route_get_ipv6_command'], target)
+    command_to_execute = join_command(arguments)
+    test_result, test_output = run_subprocess(arguments)
     if test_result == 'OK':
         test_result = 'Saved to file'
     return command_to_execute, test_result, test_output
@@ -633,29 +712,57 @@ def test_get_route(task, target):
 
 
 def get_gateway():
+    # Both gateway pings run at the same time and need the same lookup,
+    # the lock makes the second one wait for the cached result of the first
+    with GATEWAY_LOCK:
+        return lookup_gateway()
+
+
+@functools.lru_cache(maxsize=1)
+def lookup_gateway():
     gateway_ipv4 = "<IPv4 gateway not determined>"
     gateway_ipv6 = "<IPv6 gateway not determined>"
 
     _, test_output = run_subprocess(SETTINGS['get_gateway_ipv4_command'])
-    match = re.search(SETTINGS['gateway_ipv4_regex'], test_output)
+    match = SETTINGS['gateway_ipv4_regex'].search(test_output)
     if match:
         gateway_ipv4 = match.group(1)
 
     _, test_output = run_subprocess(SETTINGS['get_gateway_ipv6_command'])
-    match = re.search(SETTINGS['gateway_ipv6_regex'], test_output)
+    match = SETTINGS['gateway_ipv6_regex'].search(test_output)
     if match:
         gateway_ipv6 = match.group(1)
 
     return gateway_ipv4, gateway_ipv6
 
 
-def run_subprocess(command_to_execute, subprocess_timeout=SUBPROCESS_TIMEOUT):
+def join_command(arguments):
+    # Command line of an argument list, as it's shown in logs and reports
+    return ' '.join(map(shlex.quote, arguments))
+
+
+def run_subprocess(command_to_execute, subprocess_timeout=SUBPROCESS_TIMEOUT, output_file=None):
+    # <command_to_execute> is either a command line or a ready argument list
+    if isinstance(command_to_execute, str):
+        arguments = shlex.split(command_to_execute)
+    else:
+        arguments = command_to_execute
+        command_to_execute = join_command(arguments)
+
+    # With <output_file> the command writes straight to that file and no output is returned,
+    # stderr goes to the same file in the order it's written by the command
+    if output_file is None:
+        stdout, stderr = subprocess.PIPE, subprocess.PIPE
+    else:
+        output_file.flush()
+        stdout, stderr = output_file, subprocess.STDOUT
+
     try:
         logging.info(f"Starting subprocess: {command_to_execute}")
         process = subprocess.run(
-            command_to_execute.split(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            arguments,
+            stdout=stdout,
+            stderr=stderr,
             universal_newlines=True,
             timeout=subprocess_timeout,
             encoding='utf-8',
@@ -667,7 +774,8 @@ def run_subprocess(command_to_execute, subprocess_timeout=SUBPROCESS_TIMEOUT):
         else:
             test_result = "Not OK"
 
-        test_output = process.stdout + process.stderr
+        if output_file is None:
+            test_output = process.stdout + process.stderr
 
     except FileNotFoundError:
         print(f"<{command_to_execute}> is not supported or resulted in error")
@@ -683,24 +791,43 @@ def run_subprocess(command_to_execute, subprocess_timeout=SUBPROCESS_TIMEOUT):
         test_output = "Error"
         logging.exception('')
 
+    if output_file is not None:
+        # Error messages follow anything the command has written before failing
+        if test_result not in ("OK", "Not OK"):
+            output_file.seek(0, 2)
+            output_file.write(test_output)
+        test_output = None
+
     return test_result, test_output
 
 
-def get_diagnostics(task, subfolder_path='.'):
-    timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
+def get_diagnostics(task, timestamp, subfolder_path='.'):
     filename = f"2_diag_{task['filename']}_{timestamp}.txt"
     command_to_execute = task['command']
-    _, task_output = run_subprocess(command_to_execute)
 
-    with open(f'{subfolder_path}/{DIAGS_FOLDER}/{filename}', 'w', encoding='utf-8') as file:
+    # The output goes straight to the file, it's read back only if there is something to search
+    with open(f'{subfolder_path}/{DIAGS_FOLDER}/{filename}', 'w+',
+              encoding='utf-8', errors='replace') as file:
         file.write(f"Executed command: {command_to_execute}\n\n")
-        for line in task_output:
-            file.write(line)
-
-    search_results = []
-    for expression in task['expressions']:
-        search_results.extend(re.findall(expression, task_output))
-    search_results = ('\n'.join(search_results))
+        output_start = file.tell()
+        run_subprocess(task['argv'], output_file=file)
+        file.flush()
+
+        search_results = None
+        if task['expressions'] is not None and not task['expressions']:
+            search_results = ''
+        elif task['byte_patterns']:
+            search_results = search_mapped_output(task['byte_patterns'], file, output_start)
+
+        if search_results is None:
+            file.seek(output_start)
+            task_output = file.read()
+            if task['expressions'] is None:
+                search_results = task_output
+            elif task['split_output']:
+                search_results = '\n'.join(task_output.split())
+            else:
+                search_results = '\n'.join(search_expressions(task['expressions'], task_output))
 
     diagnostic_results = {
         'command': command_to_execute,
@@ -710,45 +837,46 @@ def get_diagnostics(task, subfolder_path='.'):
     return diagnostic_results
 
 
-def execute_test(test, subfolder_path='.'):
-    test_results = {}
+def execute_task(test, task, timestamp, subfolder_path='.'):
+    # All files of the run share the timestamp, test and task names keep them apart
+    filename = f"3_test_{test.filename}_{task}_{timestamp}.txt"
 
-    for task in test['tasks'].split():
-        # Each test has it's own timestamp
-        timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
-        filename = f"3_test_{test['filename']}_{task}_{timestamp}.txt"
+    if 'ping' in task:
+        executed_command, command_result, command_output = test_ping(
+            task, test.target)
 
-        if 'ping' in task:
-            executed_command, command_result, command_output = test_ping(
-                task, test['target'])
+    elif 'traceroute' in task:
+        executed_command, command_result, command_output = test_traceroute(
+            task, test.target)
 
-        elif 'traceroute' in task:
-            executed_command, command_result, command_output = test_traceroute(
-                task, test['target'])
+    elif 'curl' in task:
+        executed_command, command_result, command_output = test_curl(
+            task, test.target)
 
-        elif 'curl' in task:
-            executed_command, command_result, command_output = test_curl(
-                task, test['target'])
+    elif 'route' in task:
+        executed_command, command_result, command_output = test_get_route(
+            task, test.target)
 
-        elif 'route' in task:
-            executed_command, command_result, command_output = test_get_route(
-                task, test['target'])
+    with open(f"{subfolder_path}/{TESTS_FOLDER}/{filename}", 'w', encoding='utf-8') as file:
+        file.write(f"Executed command: {executed_command}\n\n")
+        file.write(command_output)
 
-        with open(f"{subfolder_path}/{TESTS_FOLDER}/{filename}", 'w', encoding='utf-8') as file:
-            file.write(f"Executed command: {executed_command}\n\n")
-            for line in command_output:
-                file.write(line)
+    # Results are printed as soon as each task finishes, the highlights follow after all of them
+    # print() writes the text and <end> separately, so the newline is put into the text itself:
+    # the whole line goes out in one write and lines from different threads don't mix
+    print(f"  {executed_command} - {command_result}\n", end='')
 
-        test_results[task] = {
-            'executed_command': executed_command,
-            'result': command_result
-        }
+    task_results = {
+        'executed_command': executed_command,
+        'result': command_result
+    }
 
-    return test_results
+    return task_results
 
 
-def measure_throughput(subfolder_path='.'):
-    command_to_execute = SETTINGS['throughput_command']
+def measure_throughput(timestamp, subfolder_path='.'):
+    arguments = SETTINGS['throughput_command']
+    command_to_execute = join_command(arguments) if arguments else arguments
     logging.info(f"Starting troughput measurement: {command_to_execute}")
     if not command_to_execute:
         logging.warning(f"Measuring throughput is not supported, no command to execute")
@@ -758,27 +886,18 @@ def measure_throughput(subfolder_path='.'):
         }
         return throughput_results
 
-    timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
     filename = f"3_throughput_{timestamp}.txt"
 
     print("Measuring throughput...")
-    _, task_output = run_subprocess(command_to_execute, THROUGHPUT_TEST_TIMEOUT)
-
-    expressions = [
-        r'Up.+ capacity: .+',
-        r'Down.+ capacity: .+',
-        r'Responsiveness: .+',
-    ]
+    _, task_output = run_subprocess(arguments, THROUGHPUT_TEST_TIMEOUT)
 
     with open(f'{subfolder_path}/{TESTS_FOLDER}/{filename}', 'w', encoding='utf-8') as file:
         file.write(f"Executed command: {command_to_execute}\n")
-        for line in task_output:
-            file.write(line)
+        file.write(task_output)
 
-    search_results = []
-    for expression in expressions:
-        search_results.extend(re.findall(expression, task_output))
-    search_results = ('\n'.join(search_results))
+    search_results = '\n'.join(
+        result for expression in THROUGHPUT_EXPRESSIONS
+        for result in expression.findall(task_output))
 
     throughput_results = {
         'command': command_to_execute,
@@ -788,67 +907,84 @@ def measure_throughput(subfolder_path='.'):
     return throughput_results
 
 
-def parse_report(start_time, report, subfolder_path='.'):
-    timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
+def parse_report(start_time, report, timestamp, subfolder_path='.'):
     filename_summary = f"0_summary_{timestamp}.txt"
     script_name = f"Yet Another Wi-Fi Diagnostic Tool v{VERSION}\n"
-    summary = []
     highlights_from_summary = []
 
     highlights_from_summary.append("\n--- ")
     highlights_from_summary.append(f"\nStarted at: {start_time}")
 
-    summary.append("\n====Diagnostics====")
-    for task in report['diags']:
-        summary.append("\n--- ")
-        summary.append(f"\nTask: {task}")
-        summary.append(f"\nCommand: {report['diags'][task]['command']}")
-        if report['diags'][task]['major_facts']:
-            summary.append(f"\n{report['diags'][task]['major_facts']}")
-
-    summary.append("\n\n====Tests====")
-    for test in report['tests']:
-        summary.append("\n--- ")
-        summary.append(f"\nTest: {test}")
-        for task in report['tests'][test]:
-            summary.append(f"\nCommand: {report['tests'][test][task]['executed_command']}")
-            if report['tests'][test][task]['result']:
-                summary.append(f"\n{report['tests'][test][task]['result']}")
-
-    summary.append("\n\n====Tcpdump====\n")
-    summary.append(f"Filter: {SETTINGS['tcpdump_output_filter']}\n")
-    summary.append(report['tcpdump']['result'])
+    # The summary is written to one in-memory buffer and taken out once for all scans below
+    summary = io.StringIO()
+    write = summary.write
+
+    write("\n====Diagnostics====")
+    for task, diagnostic_results in report['diags'].items():
+        write("\n--- ")
+        write(f"\nTask: {task}")
+        write(f"\nCommand: {diagnostic_results['command']}")
+        if diagnostic_results['major_facts']:
+            write(f"\n{diagnostic_results['major_facts']}")
+
+    write("\n\n====Tests====")
+    for test, test_results in report['tests'].items():
+        write("\n--- ")
+        write(f"\nTest: {test}")
+        for task_results in test_results.values():
+            write(f"\nCommand: {task_results['executed_command']}")
+            if task_results['result']:
+                write(f"\n{task_results['result']}")
+
+    write("\n\n====Tcpdump====\n")
+    write(f"Filter: {SETTINGS['tcpdump_output_filter']}\n")
+    write(report['tcpdump']['result'])
 
     if report['throughput']['major_facts']:
-        summary.append("\n\n====Throughput====\n")
-        summary.append(report['throughput']['major_facts'])
+        write("\n\n====Throughput====\n")
+        write(report['throughput']['major_facts'])
+
+    prepared_summary = summary.getvalue()
+
+    # Count OK, Not OK and Error results with a single scan of the summary
+    # Only failed commands are listed in the highlights, OK ones are just counted
+    status_counts = Counter()
+    failed_commands = {'Not OK': [], 'Error': []}
+    for match in SUMMARY_STATUS_REGEX.finditer(prepared_summary):
+        status = match['status']
+        status_counts[status] += 1
+        if status in failed_commands:
+            failed_commands[status].append(match['command'])
 
     # Prepare highlights from the summary
-    for _, value in HIGHLIGHTS_TEMPLATE.items():
-        piece_of_highlights = gather_highlights(summary, value)
+    for value in HIGHLIGHTS_TEMPLATE.values():
+        # Older external configs may still have templates for the statuses gathered above
+        if value['id'] in STATUS_TEMPLATE_IDS:
+            continue
+        piece_of_highlights = gather_highlights(prepared_summary, value)
         if piece_of_highlights:
             highlights_from_summary.append(f"\n{piece_of_highlights}")
 
-    score, ok_count, total_count = calculate_score(
-        summary,
-        HIGHLIGHTS_TEMPLATE['ok']['expressions'],
-        HIGHLIGHTS_TEMPLATE['not_ok']['expressions']
-        )
+    for status, commands in failed_commands.items():
+        if commands:
+            output = '\n'.join(commands)
+            highlights_from_summary.append(f"\n\n{status}:\n{output}")
+
+    score, ok_count, total_count = calculate_score(status_counts)
 
     highlights_from_summary.append(f"\n\nYour score: {score}%")
     highlights_from_summary.append(f"\n{ok_count}/{total_count} tests passed")
     highlights_from_summary.append("\n--- \n")
 
-    final_report = [script_name] + highlights_from_summary + summary
+    final_report = [script_name] + highlights_from_summary + [prepared_summary]
     human_friendly_report = "".join(final_report)
     highlights_to_print = "".join(highlights_from_summary)
 
     with open(f'{subfolder_path}/{filename_summary}', 'w', encoding='utf-8') as file:
-        for line in final_report:
-            file.write(line)
+        file.write(human_friendly_report)
 
     parsed_report = {
-        'summary': summary,
+        'summary': prepared_summary,
         'highlights_from_summary': highlights_from_summary,
         'human_friendly_report': human_friendly_report,
         'highlights_to_print': highlights_to_print
@@ -857,10 +993,9 @@ def parse_report(start_time, report, subfolder_path='.'):
     return parsed_report
 
 
-def calculate_score(data, ok_template, not_ok_template):
-    prepared_data = "".join(data)
-    ok_results = len(re.findall(ok_template, prepared_data))
-    not_ok_results = len(re.findall(not_ok_template, prepared_data))
+def calculate_score(status_counts):
+    ok_results = status_counts['OK']
+    not_ok_results = status_counts['Not OK']
     total_results = ok_results + not_ok_results
     if total_results == 0:
         score = "error in calculating "
@@ -870,175 +1005,241 @@ def calculate_score(data, ok_template, not_ok_template):
     return score, ok_results, total_results
 
 
-def gather_highlights(data, template):
-    prepared_data = "".join(data)
-    highlights = ""
-    search_results = re.findall(template['expressions'], prepared_data)
-
-    if template['id'] == 'ok':
-        pass
-    elif template['id'] == 'not_ok':
-        if search_results:
-            output = '\n'.join(search_results)
-            highlights = (f"\n{template['description']}\n{output}")
-    elif template['id'] == 'error':
-        if search_results:
-            output = '\n'.join(search_results)
-            highlights = (f"\n{template['description']}\n{output}")
-    # # You need sudo to get BSSID value using airport
-    # elif template['id'] == 'bssid_from_airport':
-    #     if search_results:
-    #         output = ' '.join(search_results)
-    #         highlights = (f"{template['description']} {output}")
-    #     else:
-    #         highlights = ("! Failed parsing BSSID from airport output")
-    elif template['id'] == 'bssid_from_logs':
-        if search_results:
-            bssid = search_results[0]
-            formatted_bssid = ':'.join(bssid[i:i+2] for i in range(0,12,2))
-            highlights = (f"{template['description']} {formatted_bssid}")
-        else:
-            highlights = ("! Failed parsing BSSID from logs")
-    elif template['id'] == 'ipv6_address':
-        if search_results:
-            output = ' '.join(search_results)
-            highlights = (f"{template['description']} {output}")
-        else:
-            highlights = ("! No valid IPv6 address")
-    elif template['id'] == 'ra_received':
-        if "Tcpdump error" in prepared_data:
-            highlights = ("! Tcpdump error - check logs")
-        elif search_results:
-            output = len(search_results)
-            highlights = (f"RA messages received: {output}")
-        else:
-            highlights = ("! No RA messages captured")
-    elif template['id'] == 'dl_throughput':
-        if not SETTINGS['throughput_command']:
-            highlights = ""
-        elif search_results:
-            output = ' '.join(search_results)
-            highlights = (f"{template['description']} {output}")
-        else:
-            highlights = ("! DL troughput: error or not supported")
-    elif template['id'] == 'ul_throughput':
-        if not SETTINGS['throughput_command']:
-            highlights = ""
-        elif search_results:
-            output = ' '.join(search_results)
-            highlights = (f"{template['description']} {output}")
-        else:
-            highlights = ("! UL troughput: error or not supported")
-    elif template['id'] == 'ssid':
+def find_all(expression, data):
+    # Plain string expressions are literal text, so a substring count is enough
+    if isinstance(expression, str):
+        return [expression] * data.count(expression)
+    return expression.findall(data)
+
+
+def search_expressions(expressions, data):
+    # Results of all expressions of a diagnostic, in the order of the expressions
+    # Each expression runs its own findall(), as expressions of one diagnostic may match
+    # overlapping text and a single combined scan would lose some of the matches
+    search_results = []
+    for expression in expressions:
+        search_results.extend(expression.findall(data))
+    return search_results
+
+
+def search_mapped_output(byte_patterns, file, output_start):
+    # Bytes patterns search the output in the file as it is, only the results are decoded
+    # The view starts at the output, so ^ and \A match at its beginning the same way as in text
+    # Returns None for output with '\r', the text read turns it into '\n' and the results differ
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped.find(b'\r', output_start) != -1:
+            return None
+        with memoryview(mapped) as view, view[output_start:] as task_output:
+            return '\n'.join(
+                result.decode('utf-8', errors='replace')
+                for result in search_expressions(byte_patterns, task_output))
+
+
+def gather_highlights(prepared_data, template):
+    search_results = find_all(template['expressions'], prepared_data)
+
+    # Templates without a special formatter are shown as description and results
+    formatter = HIGHLIGHT_FORMATTERS.get(template['id'], format_default)
+    return formatter(template, search_results, prepared_data)
+
+
+# Formatters below are called by gather_highlights() with the same arguments
+# Each returns a piece of highlights for one template, "" skips the template
+
+def format_default(template, search_results, prepared_data):
+    output = ' '.join(search_results)
+    return f"{template['description']} {output}"
+
+
+def format_on_new_line(template, search_results, prepared_data):
+    output = ' '.join(search_results)
+    # Start from new line for better readability
+    return f"\n{template['description']} {output}"
+
+
+# # You need sudo to get BSSID value using airport
+# def format_bssid_from_airport(template, search_results, prepared_data):
+#     if search_results:
+#         output = ' '.join(search_results)
+#         return f"{template['description']} {output}"
+#     return "! Failed parsing BSSID from airport output"
+
+
+def format_bssid_from_logs(template, search_results, prepared_data):
+    if search_results:
+        bssid = search_results[0]
+        # Octet offsets are listed as a constant tuple, bytes.hex(':') needs Python 3.8
+        formatted_bssid = ':'.join(bssid[i:i+2] for i in (0, 2, 4, 6, 8, 10))
+        return f"{template['description']} {formatted_bssid}"
+    return "! Failed parsing BSSID from logs"
+
+
+def format_ipv6_address(template, search_results, prepared_data):
+    if search_results:
         output = ' '.join(search_results)
-        # Start from new line for better readability
-        highlights = (f"\n{template['description']} {output}")
-    elif template['id'] == 'computer_name':
+        return f"{template['description']} {output}"
+    return "! No valid IPv6 address"
+
+
+def format_ra_received(template, search_results, prepared_data):
+    if "Tcpdump error" in prepared_data:
+        return "! Tcpdump error - check logs"
+    if search_results:
+        output = len(search_results)
+        return f"RA messages received: {output}"
+    return "! No RA messages captured"
+
+
+def format_dl_throughput(template, search_results, prepared_data):
+    if not SETTINGS['throughput_command']:
+        return ""
+    if search_results:
         output = ' '.join(search_results)
-        # Start from new line for better readability
-        highlights = (f"\n{template['description']} {output}")
-    else:
+        return f"{template['description']} {output}"
+    return "! DL troughput: error or not supported"
+
+
+def format_ul_throughput(template, search_results, prepared_data):
+    if not SETTINGS['throughput_command']:
+        return ""
+    if search_results:
         output = ' '.join(search_results)
-        highlights = (f"{template['description']} {output}")
+        return f"{template['description']} {output}"
+    return "! UL troughput: error or not supported"
+
 
-    return highlights
+# Template 'id' to the formatter of its highlights
+HIGHLIGHT_FORMATTERS = {
+    'bssid_from_logs': format_bssid_from_logs,
+    'ipv6_address': format_ipv6_address,
+    'ra_received': format_ra_received,
+    'dl_throughput': format_dl_throughput,
+    'ul_throughput': format_ul_throughput,
+    'ssid': format_on_new_line,
+    'computer_name': format_on_new_line,
+}
 
 
-def make_json(report, subfolder_path='.'):
-    timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
+def make_json(report, timestamp, subfolder_path='.'):
     filename_json = f"1_report_{timestamp}.json"
-    with open(f'{subfolder_path}/{REPORTS_FOLDER}/{filename_json}', 'w', encoding='utf-8') as file:
+    # json.dump() writes the report in many small pieces, the buffer turns them into a few writes
+    with open(f'{subfolder_path}/{REPORTS_FOLDER}/{filename_json}', 'w', encoding='utf-8',
+              buffering=REPORT_BUFFER_SIZE) as file:
         json.dump(report, file)
 
 
-def markdownify_report(report, parsed_report, subfolder_path='.'):
-    timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
+def format_markdown_task(info):
+    # Command and result of a test task in the "Tests" section of the markdown report
+    result = info['result']
+    if result == 'Not OK':
+        result_block = f"\n```diff\n- {result}\n```"
+    elif result:
+        result_block = f"\n```\n{result}\n```"
+    else:
+        result_block = ''
+    return f"\n**Command:** `{info['executed_command']}`</br>{result_block}"
+
+
+def markdownify_report(report, parsed_report, timestamp, subfolder_path='.'):
     filename_md = f"1_markdown_{timestamp}.md"
     diagnostics = []
     tests = []
     tcpdump_output = []
 
-    for task in report['diags']:
+    for task, diag in report['diags'].items():
         diagnostics.append("\n\n---\n")
         diagnostics.append(f"\n**Task:** `{task}`</br>")
-        diagnostics.append(f"\n**Command:** `{report['diags'][task]['command']}`</br>")
-        if report['diags'][task]['major_facts']:
-            diagnostics.append(f"\n```\n{report['diags'][task]['major_facts']}\n```")
-
-    for test in report['tests']:
-        tests.append("\n\n---\n")
-        tests.append(f"\n**Test:** `{test}`</br>")
-        for task in report['tests'][test]:
-            tests.append(f"\n**Command:** `{report['tests'][test][task]['executed_command']}`</br>")
-            if report['tests'][test][task]['result'] == 'Not OK':
-                tests.append(f"\n```diff\n- {report['tests'][test][task]['result']}\n```")
-            elif report['tests'][test][task]['result']:
-                tests.append(f"\n```\n{report['tests'][test][task]['result']}\n```")
+        diagnostics.append(f"\n**Command:** `{diag['command']}`</br>")
+        if diag['major_facts']:
+            diagnostics.append(f"\n```\n{diag['major_facts']}\n```")
+
+    # One string per test task, so <tests> grows by a single item for each of them
+    for test, tasks in report['tests'].items():
+        tests.append(f"\n\n---\n\n**Test:** `{test}`</br>")
+        tests.extend(format_markdown_task(info) for info in tasks.values())
 
     tcpdump_output.append('\n')
     tcpdump_output.append(report['tcpdump']['result'])
 
+    # All parts are joined and written to the file at once
+    markdown = []
+    markdown.append(f"#### Yet Another Wi-Fi Diagnostic Tool v{VERSION}\n")
+    markdown.append("```")
+    markdown.extend(parsed_report['highlights_from_summary'])
+    markdown.append("```\n\n")
+    markdown.append("<details>\n  <summary>Diagnostics</summary>\n")
+    markdown.extend(diagnostics)
+    markdown.append("\n</details>")
+
+    markdown.append("<details>\n  <summary>Tests</summary>\n")
+    markdown.extend(tests)
+    markdown.append("\n</details>")
+
+    markdown.append("<details>\n  <summary>Tcpdump</summary>\n")
+    markdown.append(f"\n**Filter:** `{SETTINGS['tcpdump_output_filter']}`\n")
+    markdown.append("\n```")
+    markdown.extend(tcpdump_output)
+    markdown.append("\n```")
+    markdown.append("\n</details>")
+
     with open(f'{subfolder_path}/{REPORTS_FOLDER}/{filename_md}', 'w', encoding='utf-8') as file:
+        file.write("".join(markdown))
+
 
-        file.write(f"#### Yet Another Wi-Fi Diagnostic Tool v{VERSION}\n")
-        file.write("```")
-        for line in parsed_report['highlights_from_summary']:
-            file.write(line)
-        file.write("```\n\n")
-        file.write("<details>\n  <summary>Diagnostics</summary>\n")
-        for line in diagnostics:
-            file.write(line)
-        file.write("\n</details>")
-
-        file.write("<details>\n  <summary>Tests</summary>\n")
-        for line in tests:
-            file.write(line)
-        file.write("\n</details>")
-
-        file.write("<details>\n  <summary>Tcpdump</summary>\n")
-        file.write(f"\n**Filter:** `{SETTINGS['tcpdump_output_filter']}`\n")
-        file.write("\n```")
-        for line in tcpdump_output:
-            file.write(line)
-        file.write("\n```")
-        file.write("\n</details>")
-
-
-def run_simultaneous_collection(dataset, subfolder_path='.'):
+def run_simultaneous_collection(dataset, timestamp, subfolder_path='.'):
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        if dataset == DIAGNOSTICS:
-            future_list = [ex.submit(get_diagnostics, dataset[data], subfolder_path)
-                           for data in dataset]
-        elif dataset == TESTS:
-            future_list = [ex.submit(execute_test, dataset[data], subfolder_path)
-                           for data in dataset]
-
-        # Make a new dictionary out of dataset keys and future collection results
-        dataset_keys = list(dataset.keys())
-        future_results = [future.result() for future in future_list]
-        collection_report = dict(zip(dataset_keys, future_results))
+        if dataset is DIAGNOSTICS:
+            # map() yields the results in the order of the dataset keys
+            results = ex.map(lambda task: get_diagnostics(task, timestamp, subfolder_path),
+                             dataset.values())
+            collection_report = dict(zip(dataset.keys(), results))
+        elif dataset is TESTS:
+            # Every task of every test is a separate job,
+            # so that a long traceroute does not hold the rest of its test
+            jobs = [(test, task) for test in dataset for task in test.tasks]
+            results = ex.map(lambda job: execute_task(*job, timestamp, subfolder_path), jobs)
+
+            # Group task results back by test, in the order of the config
+            collection_report = {test.name: {} for test in dataset}
+            for (test, task), result in zip(jobs, results):
+                collection_report[test.name][task] = result
 
     return collection_report
 
 
 def make_archive(diag_name):
     # Add folder contents to archive so that it's easy to share
+    # Files are stored as <diag_name>/..., the same way 'zip -r' run from <FOLDER_NAME> does
     archive_name = f'0_archive_{diag_name}.zip'
+    archive_path = f'{FOLDER_NAME}/{diag_name}/{archive_name}'
+    # zipfile pulls in the compression modules, they are loaded only when the archive is made
+    import zipfile
     try:
-        zip_command = f'zip -r {diag_name}/{archive_name} {diag_name}'
-        logging.info(f"Create archive: {zip_command}")
-        subprocess.run(
-            zip_command.split(),
-            cwd=FOLDER_NAME,
-            stderr=subprocess.DEVNULL,
-            stdout=subprocess.DEVNULL,
-            check=True
-        )
-    except subprocess.CalledProcessError:
+        logging.info(f"Create archive: {archive_path}")
+        with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for folder, _, files in os.walk(f'{FOLDER_NAME}/{diag_name}'):
+                arcfolder = os.path.relpath(folder, FOLDER_NAME)
+                for file in sorted(files):
+                    if folder == f'{FOLDER_NAME}/{diag_name}' and file == archive_name:
+                        continue
+                    archive.write(f'{folder}/{file}', f'{arcfolder}/{file}')
+    except (OSError, zipfile.BadZipFile):
         logging.exception("Error while creating the archive")
 
 
-def check_capabilities(started_by, os_type):
+def probe_tcpdump():
+    # Raises CalledProcessError or TimeoutExpired, check_capabilities() handles them
+    return subprocess.run(
+        SETTINGS['tcpdump_check_capabilities'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        timeout=5,
+        check=True
+    )
+
+
+def check_capabilities(started_by, os_type, tcpdump_probe):
     # EXTERNAL_CONFIG is True if there is a properly named external configuration file
     # within the main scripts directory
     if EXTERNAL_CONFIG:
@@ -1059,15 +1260,9 @@ def check_capabilities(started_by, os_type):
         logging.warning(f"Trying to run script on unsupported system: {os_type}")
 
     # Check if it's possible to use tcpdump
+    # <tcpdump_probe> is the future of probe_tcpdump() started by initialize_system()
     try:
-        subprocess.run(
-            SETTINGS['tcpdump_check_capabilities'].split(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding='utf-8',
-            timeout=5,
-            check=True
-        )
+        tcpdump_probe.result()
 
     except subprocess.CalledProcessError as error:
         conflicts['check_tcpdump']['conflict'] = True
@@ -1100,12 +1295,20 @@ def check_capabilities(started_by, os_type):
 
 
 def initialize_system(start_time):
-    timestamp = start_time.strftime('%y%m%d_%H%M%S')
+    # The only timestamp formatted during the run, time.strftime() calls the C library directly
+    timestamp = time.strftime('%y%m%d_%H%M%S', start_time.timetuple())
+
+    # Probing tcpdump can take up to 5 seconds while it waits for a frame,
+    # so it runs in background while the folders and logs are prepared
+    probe_executor = ThreadPoolExecutor(max_workers=1)
+    tcpdump_probe = probe_executor.submit(probe_tcpdump)
+    probe_executor.shutdown(wait=False)
 
     # If you start the script with sudo, <started_by> == 'root' != <username>
-    started_by = subprocess.check_output("whoami", encoding='utf-8').strip()
-    username = subprocess.check_output("logname", encoding='utf-8').strip()
-    hostname = subprocess.check_output("hostname", encoding='utf-8').strip()
+    # The names come from the user database, sudo keeps the name of the invoking user in SUDO_USER
+    started_by = pwd.getpwuid(os.geteuid()).pw_name
+    username = os.environ.get('SUDO_USER') or pwd.getpwuid(os.getuid()).pw_name
+    hostname = socket.gethostname()
 
     # Running the script without sudo will not gather all available diagnostics
     # So, lets mark all non-sudo attempts as "basic_wifi_diag"
@@ -1116,37 +1319,43 @@ def initialize_system(start_time):
 
     # Create a folder to store all gathered diagnostics
     subfolder_path = (f"{FOLDER_NAME}/{diag_name}")
-    subprocess.run(f"mkdir {FOLDER_NAME}".split(), stderr=subprocess.DEVNULL, check=False)
     # Each time we run the script, create a timestamped subfolder inside the <FOLDER_NAME>
     try:
-        subprocess.run(f"mkdir {subfolder_path}".split(), check=True)
-        subprocess.run(f"mkdir {subfolder_path}/{REPORTS_FOLDER}".split(), check=True)
-        subprocess.run(f"mkdir {subfolder_path}/{DIAGS_FOLDER}".split(), check=True)
-        subprocess.run(f"mkdir {subfolder_path}/{TESTS_FOLDER}".split(), check=True)
-    except subprocess.CalledProcessError:
+        os.makedirs(FOLDER_NAME, exist_ok=True)
+        os.mkdir(subfolder_path)
+        os.mkdir(f"{subfolder_path}/{REPORTS_FOLDER}")
+        os.mkdir(f"{subfolder_path}/{DIAGS_FOLDER}")
+        os.mkdir(f"{subfolder_path}/{TESTS_FOLDER}")
+    except OSError:
         print(f"Error while creating {subfolder_path} folder structure")
         print(f"Check permissions for {FOLDER_NAME}")
         exit()
 
     # Add logging to the file in the created subfolder
-    logging.basicConfig(
-        format='%(asctime)s %(name)s %(levelname)s %(message)s',
-        filename=f"{subfolder_path}/logs_{timestamp}.log",
-        level=logging.INFO
-    )
+    # Records are put to <LOG_QUEUE> and written to the file by a background thread,
+    # so that workers don't wait for the disk; the queue is not bounded, no records are dropped
+    root_logger = logging.getLogger()
+    if not root_logger.handlers:
+        file_handler = logging.FileHandler(f"{subfolder_path}/logs_{timestamp}.log")
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        root_logger.addHandler(logging.handlers.QueueHandler(LOG_QUEUE))
+        root_logger.setLevel(logging.INFO)
+        listener = logging.handlers.QueueListener(LOG_QUEUE, file_handler)
+        listener.start()
+        # Writes the rest of the queue and closes the file when the script exits
+        atexit.register(listener.stop)
     logging.info(f"Yet Another Wi-Fi Diagnostic Tool v{VERSION} started by {started_by}")
 
     # Make sure that <username> owns the folder even if the script started as root
     if username != started_by:
         try:
             logging.info(f"Ensuring the correct ownership of {FOLDER_NAME}")
-            subprocess.run(f"chown {username} {FOLDER_NAME}".split(), check=True)
-        except subprocess.CalledProcessError:
+            os.chown(FOLDER_NAME, pwd.getpwnam(username).pw_uid, -1)
+        except (KeyError, OSError):
             logging.exception('')
 
     # Check if the script is fully compilant with the system
-    os_type = subprocess.check_output("uname", encoding='utf-8').strip().lower()
-    conflicts = check_capabilities(started_by, os_type)
+    conflicts = check_capabilities(started_by, OS_TYPE, tcpdump_probe)
 
     print("---")
     print(f"\nYet Another Wi-Fi Diagnostic Tool v{VERSION}")
@@ -1156,19 +1365,22 @@ def initialize_system(start_time):
 
 
 def tcpdump_start(subfolder_path, timestamp, conflicts):
+    tcpdump_command = SETTINGS['tcpdump_command']
     tcpdump_filename = f'{subfolder_path}/dump_{timestamp}.pcap'
     # Run tcpdump only in case no conflicts found at check_compatibility() stage
-    if True in conflicts['check_tcpdump'].values():
+    if conflicts['check_tcpdump'].get('conflict'):
         dump = None
         logging.error("Not starting tcpdump due to previously found conflicts")
         return dump, tcpdump_filename
     try:
-        logging.info(f"Starting {SETTINGS['tcpdump_command']} {tcpdump_filename}")
+        logging.info(f"Starting {join_command(tcpdump_command)} {tcpdump_filename}")
         # With Popen tcpdump will run in background until dump.terminate()
         # dump.terminate() will be executed in tcpdump_finish()
+        # The capture itself is written by tcpdump to <tcpdump_filename> (-w), not through Python,
+        # nothing reads its stdout, only stderr is kept for the error message below
         dump = subprocess.Popen(
-            f"{SETTINGS['tcpdump_command']} {tcpdump_filename}".split(),
-            stdout=subprocess.PIPE,
+            (*tcpdump_command, tcpdump_filename),
+            stdout=subprocess.DEVNULL,
             stderr=subprocess.PIPE,
             universal_newlines=True,
             encoding='utf-8'
@@ -1189,7 +1401,7 @@ def tcpdump_start(subfolder_path, timestamp, conflicts):
 
 def tcpdump_finish(dump, tcpdump_filename, start_time, conflicts):
     # Run tcpdump only in case no conflicts found at check_compatibility() stage
-    if True in conflicts['check_tcpdump'].values():
+    if conflicts['check_tcpdump'].get('conflict'):
         tcpdump_report = {
             'executed_command': None,
             'read_command': None,
@@ -1202,34 +1414,39 @@ def tcpdump_finish(dump, tcpdump_filename, start_time, conflicts):
     end_time = datetime.now()
     execution_time = (end_time - start_time).seconds
 
-    if execution_time < SETTINGS['tcpdump_timeout']:
-        extra_timeout = SETTINGS['tcpdump_timeout'] - execution_time
+    tcpdump_timeout = SETTINGS['tcpdump_timeout']
+    if execution_time < tcpdump_timeout:
+        extra_timeout = tcpdump_timeout - execution_time
         print(f"\nWaiting extra {extra_timeout} seconds for tcpdump to finish its job...")
         time.sleep(extra_timeout)
 
     # Try to terminate tcpdump
+    # Waiting for tcpdump to exit makes sure the file is closed correctly before further reading
     try:
         logging.info("Trying to terminate tcpdump")
         dump.terminate()
+        dump.wait(timeout=TCPDUMP_STOP_TIMEOUT)
         logging.info("Successfully terminated tcpdump")
+    except subprocess.TimeoutExpired:
+        logging.error(f"tcpdump did not exit in {TCPDUMP_STOP_TIMEOUT} seconds, killing it")
+        dump.kill()
+        dump.wait()
     except subprocess.SubprocessError:
         logging.exception('')
 
-    # Adding the delay helps to close the file correctly before further reading
-    time.sleep(1)
-
     # Read the contents of .pcap using the filter from SETTINGS
     try:
-        read_tcpdump_command = (
-            f"tcpdump \'{SETTINGS['tcpdump_output_filter']}\' -n -r {tcpdump_filename}")
+        # The filter is passed as a single argument, so no shell is needed to quote it
+        read_tcpdump_arguments = (
+            'tcpdump', SETTINGS['tcpdump_output_filter'], '-n', '-r', tcpdump_filename)
+        read_tcpdump_command = join_command(read_tcpdump_arguments)
         logging.info(f"Reading the tcpdump file: {read_tcpdump_command}")
         tcpdump_reading = subprocess.run(
-            read_tcpdump_command,
+            read_tcpdump_arguments,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
             encoding='utf-8',
-            shell=True,
             check=True
         )
         if tcpdump_reading.stdout:
@@ -1240,9 +1457,13 @@ def tcpdump_finish(dump, tcpdump_filename, start_time, conflicts):
         logging.exception("tcpdump_finish: unable to read tcpdump file")
         logging.error(f"tcpdump_finish: {error.stderr}")
         tcpdump_output = "Error"
+    except OSError:
+        # Without a shell a missing tcpdump binary is not an exit code, but an exception
+        logging.exception("tcpdump_finish: unable to run tcpdump")
+        tcpdump_output = "Error"
 
     tcpdump_report = {
-        'executed_command': SETTINGS['tcpdump_command'],
+        'executed_command': join_command(SETTINGS['tcpdump_command']),
         'read_command': read_tcpdump_command,
         'result': tcpdump_output
     }
@@ -1254,22 +1475,159 @@ def get_adapter_name(os_type):
     if os_type == 'darwin':
         adapter_name = 'en0'
     elif os_type == 'linux':
-        expression = r'Interface (\S*)'
-        iw_output = subprocess.check_output("iw dev".split(), encoding='utf-8').strip()
-        adapter_name = re.findall(expression, iw_output)[0]
+        iw_output = subprocess.check_output(('iw', 'dev'), encoding='utf-8')
+        match = IFACE_REGEX.search(iw_output)
+        adapter_name = match.group(1) if match else 'unknown'
     else:
         adapter_name = 'unknown'
 
     return adapter_name
 
 
+def compile_pattern(expression):
+    # Patterns written in plain ASCII are compiled with re.ASCII,
+    # so \S, \d and \w are checked against ASCII instead of the Unicode tables
+    # Patterns compiled in advance by the config are used as is
+    # The same expression used in several places is compiled once and shared, see PATTERN_CACHE
+    if not isinstance(expression, str):
+        return expression
+    if expression in PATTERN_CACHE:
+        return PATTERN_CACHE[expression]
+    try:
+        expression.encode('ascii')
+    except UnicodeEncodeError:
+        pattern = re.compile(expression)
+    else:
+        pattern = re.compile(expression, re.ASCII)
+    PATTERN_CACHE[expression] = pattern
+    return pattern
+
+
+def to_bytes_pattern(expression):
+    # Same ASCII-only expression, compiled to search bytes
+    # Escapes of non-ASCII characters, e.g. \xe9 or \u00e9, mean a character in a str pattern,
+    # but a raw byte or nothing at all in a bytes one, such expressions get None and stay str
+    # The same source may come with different flags, so both are the cache key
+    if NON_ASCII_ESCAPE_REGEX.search(expression.pattern):
+        return None
+    key = (expression.pattern.encode('ascii'), expression.flags)
+    if key not in PATTERN_CACHE:
+        try:
+            PATTERN_CACHE[key] = re.compile(*key)
+        except re.error:
+            PATTERN_CACHE[key] = None
+    return PATTERN_CACHE[key]
+
+
+def split_settings(settings):
+    # Commands and arguments in settings are argument tuples
+    # Older external configs give them as strings, those are split once here
+    return {
+        key: (
+            tuple(shlex.split(value))
+            if isinstance(value, str) and key.endswith(SPLIT_SETTINGS_SUFFIXES) else value)
+        for key, value in settings.items()
+    }
+
+
+def split_commands(diagnostics):
+    # Every diagnostic gets both 'argv' to execute and 'command' to show in the report
+    # The command line is split or joined here once, not on every run
+    return {
+        name: {
+            **task,
+            'argv': (
+                tuple(task['argv']) if 'argv' in task
+                else tuple(shlex.split(task['command']))),
+            'command': (
+                task['command'] if 'command' in task
+                else join_command(task['argv'])),
+        }
+        for name, task in diagnostics.items()
+    }
+
+
+def compile_expressions(settings, diagnostics, highlights_template):
+    # Compile all regular expressions once at config-load time,
+    # so that they are not looked up in re module cache on every search
+    # Applies both to built-in and external configuration, originals are not modified
+    settings = {
+        key: compile_pattern(value) if key.endswith('_regex') else value
+        for key, value in settings.items()
+    }
+
+    diagnostics = {
+        name: {
+            **task,
+            'expressions': (
+                None if task['expressions'] is None
+                else [compile_pattern(expression) for expression in task['expressions']])
+        }
+        for name, task in diagnostics.items()
+    }
+    for task in diagnostics.values():
+        # Whitespace-separated words, e.g. the public IP, don't need the regex engine
+        task['split_output'] = (
+            task['expressions'] is not None
+            and [expression.pattern for expression in task['expressions']] == [SPLIT_EXPRESSION])
+        # ASCII expressions also get bytes patterns that search the output file directly,
+        # in bytes \S, \d and \w mean the same as in a str pattern compiled with re.ASCII
+        # The str patterns are kept for output that has to be read as text, see get_diagnostics()
+        task['byte_patterns'] = None
+        if (task['expressions'] and not task['split_output']
+                and all(expression.flags & re.ASCII for expression in task['expressions'])):
+            byte_patterns = [to_bytes_pattern(expression) for expression in task['expressions']]
+            if None not in byte_patterns:
+                task['byte_patterns'] = byte_patterns
+
+    # Highlights without any regex syntax are kept as plain strings,
+    # find_all() counts them with str.count() instead of running the regex engine
+    # Patterns compiled in advance by the config are left to compile_pattern()
+    highlights_template = {
+        name: {
+            **template,
+            'expressions': (
+                template['expressions']
+                if isinstance(template['expressions'], str)
+                and REGEX_METACHARACTERS.isdisjoint(template['expressions'])
+                else compile_pattern(template['expressions']))
+        }
+        for name, template in highlights_template.items()
+    }
+
+    return settings, diagnostics, highlights_template
+
+
+def make_tests(tests):
+    # Built-in tests are already a tuple of Test records
+    # External configs describe tests as a dictionary, convert it to the same records
+    # Older external configs list tasks as a space-separated string
+    # Split them once here, so that execute_task() gets ready task names
+    # Config keys and literals are interned by the compiler already, but split() results are not,
+    # so intern task names as they become keys of the tests report
+    if not isinstance(tests, dict):
+        return tuple(tests)
+    return tuple(
+        Test(
+            name,
+            test['target'],
+            tuple(intern(task) for task in test['tasks'].split())
+            if isinstance(test['tasks'], str) else tuple(test['tasks']),
+            test['filename'])
+        for name, test in tests.items()
+    )
+
+
 def read_config():
     # The purpose of read_config() is to set some config CONSTANTS
     # that will be accessible globally and will not be changed
     global FACTS, TESTS, SETTINGS, DIAGNOSTICS, HIGHLIGHTS_TEMPLATE, EXTERNAL_CONFIG
+    # Only needed once, to load the external config, so it's not imported with the script
+    import importlib
 
-    os_type = subprocess.check_output("uname", encoding='utf-8').strip().lower()
-    adapter_name = get_adapter_name(os_type)
+    adapter_name = get_adapter_name(OS_TYPE)
+    # The gateway is looked up once per run, forget the one found by a previous main() call
+    lookup_gateway.cache_clear()
 
     # Check if external config filename is passed as an argument
     if len(argv) > 1:
@@ -1289,11 +1647,13 @@ def read_config():
         EXTERNAL_CONFIG = False
         constants = set_constants(adapter_name)
 
-    FACTS = constants['facts']['universal']
-    TESTS = constants['tests']['universal']
-    SETTINGS = constants['settings'][os_type]
-    DIAGNOSTICS = constants['diagnostics'][os_type]
-    HIGHLIGHTS_TEMPLATE = constants['highlights_template'][os_type]
+    FACTS = freeze(constants['facts']['universal'])
+    TESTS = make_tests(constants['tests']['universal'])
+    SETTINGS, DIAGNOSTICS, HIGHLIGHTS_TEMPLATE = map(freeze, compile_expressions(
+        split_settings(constants['settings'][OS_TYPE]),
+        split_commands(constants['diagnostics'][OS_TYPE]),
+        constants['highlights_template'][OS_TYPE]
+    ))
 
 
 def main():
@@ -1304,6 +1664,7 @@ def main():
     start_time = datetime.now()
 
     # Create folders, start logs, check capabilities, look for conflicts
+    # The run <timestamp> is used in the names of all files of the report
     timestamp, diag_name, subfolder_path, conflicts = initialize_system(start_time)
     report['conflicts'] = conflicts
 
@@ -1312,31 +1673,36 @@ def main():
 
     # Collect diagnostics with accordance to the DIAGNOSTICS template
     print("\nCollecting diagnostics...")
-    report['diags'] = run_simultaneous_collection(DIAGNOSTICS, subfolder_path)
+    report['diags'] = run_simultaneous_collection(DIAGNOSTICS, timestamp, subfolder_path)
 
     # Perform tests with accordance to the TESTS template
     print("Performing tests...")
-    report['tests'] = run_simultaneous_collection(TESTS, subfolder_path)
+    report['tests'] = run_simultaneous_collection(TESTS, timestamp, subfolder_path)
 
     # Terminate the tcpdump and parse the output .pcap file to form a report
     report['tcpdump'] = tcpdump_finish(dump, tcpdump_filename, start_time, conflicts)
 
     # Try to measure throughput if OS has a right tool
-    report['throughput'] = measure_throughput(subfolder_path)
+    # tcpdump already runs in background alongside diagnostics and tests,
+    # but the measurement waits for it to stop: the capture has no filter,
+    # so the throughput traffic would end up in the .pcap and the archive
+    report['throughput'] = measure_throughput(timestamp, subfolder_path)
 
     # Save the <report> as .json file
-    make_json(report, subfolder_path)
+    make_json(report, timestamp, subfolder_path)
 
     # Parse the <report> to return a human-readable summary, save it to a file
     # Print the most important highlights
-    parsed_report = parse_report(start_time, report, subfolder_path)
+    parsed_report = parse_report(start_time, report, timestamp, subfolder_path)
     print(parsed_report['highlights_to_print'])
     human_friendly_report = parsed_report['human_friendly_report']
 
     # Generate a markdown-syntax report and save it to a file
-    markdownify_report(report, parsed_report, subfolder_path)
+    markdownify_report(report, parsed_report, timestamp, subfolder_path)
 
     # Gather all files into one archive, so that it's easy to share
+    # Wait for the queued log records to reach the log file first
+    LOG_QUEUE.join()
     make_archive(diag_name)
 
     end_time = datetime.now()